@@ -0,0 +1,304 @@
+"""
+ajuste_trazas.py
+
+Ajuste al mapa (map-matching) de trazas GPS sobre el grafo de calles de Madrid
+mediante un modelo oculto de Markov resuelto con el algoritmo de Viterbi.
+"""
+
+import itertools
+import multiprocessing
+import os
+import networkx as nx
+from math import radians, cos, sqrt, pi
+from typing import Iterable, Iterator, List, Tuple
+
+from callejero import RADIO_TIERRA
+from gps import calcula_peso_longitud
+from grafo_pesado import dijkstra_acotado
+
+METROS_POR_GRADO = RADIO_TIERRA * pi / 180  # Metros por grado de latitud
+
+# Candidato: (u, v, fraccion, distancia) -> arista (u, v), posición relativa de la proyección
+# sobre ella (0 en u, 1 en v) y distancia en metros del punto GPS a la arista
+Candidato = Tuple[object, object, float, float]
+
+
+def construye_indice_aristas(G: nx.DiGraph, tam_celda: float = 0.002) -> dict:
+    """
+    Construye una rejilla regular sobre las coordenadas de los nodos y guarda en cada celda
+    las aristas cuyo rectángulo envolvente la toca. Se construye una sola vez por grafo.
+
+    Args:
+        G (nx.DiGraph): Grafo con coordenadas "x" (longitud) e "y" (latitud) en los nodos.
+        tam_celda (float): Lado de cada celda en grados (0.002º son unos 200 metros en Madrid).
+
+    Returns:
+        dict: Diccionario celda (fila, columna) -> lista de aristas (u, v), más la clave "tam_celda".
+    """
+    indice = {"tam_celda": tam_celda}
+    for u, v in G.edges():
+        y1, x1 = G.nodes[u]["y"], G.nodes[u]["x"]
+        y2, x2 = G.nodes[v]["y"], G.nodes[v]["x"]
+        for fila in range(int(min(y1, y2) // tam_celda), int(max(y1, y2) // tam_celda) + 1):
+            for columna in range(int(min(x1, x2) // tam_celda), int(max(x1, x2) // tam_celda) + 1):
+                indice.setdefault((fila, columna), []).append((u, v))
+    return indice
+
+
+def _proyecta(lat: float, lon: float, lat1: float, lon1: float, lat2: float, lon2: float) -> Tuple[float, float]:
+    """Proyecta un punto sobre un segmento (aproximación plana local) y devuelve (fracción, distancia en metros)."""
+    escala_x = METROS_POR_GRADO * cos(radians(lat))
+    px, py = (lon - lon1) * escala_x, (lat - lat1) * METROS_POR_GRADO
+    sx, sy = (lon2 - lon1) * escala_x, (lat2 - lat1) * METROS_POR_GRADO
+    norma2 = sx * sx + sy * sy
+    fraccion = 0.0 if norma2 == 0 else max(0.0, min(1.0, (px * sx + py * sy) / norma2))
+    dx, dy = px - fraccion * sx, py - fraccion * sy
+    return fraccion, sqrt(dx * dx + dy * dy)
+
+
+def _distancia_puntos(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia en metros entre dos puntos cercanos (aproximación plana local)."""
+    dx = (lon2 - lon1) * METROS_POR_GRADO * cos(radians((lat1 + lat2) / 2))
+    dy = (lat2 - lat1) * METROS_POR_GRADO
+    return sqrt(dx * dx + dy * dy)
+
+
+def busca_candidatos(G: nx.DiGraph, indice: dict, lat: float, lon: float, radio: float = 50, max_candidatos: int = 5) -> List[Candidato]:
+    """
+    Devuelve las aristas más cercanas a un punto GPS dentro de un radio, usando el índice de rejilla.
+
+    Args:
+        G (nx.DiGraph): Grafo de calles.
+        indice (dict): Índice devuelto por construye_indice_aristas.
+        lat (float): Latitud del punto en grados.
+        lon (float): Longitud del punto en grados.
+        radio (float): Distancia máxima en metros entre el punto y la arista.
+        max_candidatos (int): Número máximo de calles devueltas. El límite se aplica por calle y no por
+            arista dirigida: de cada calle de doble sentido se devuelven sus dos aristas (u, v) y (v, u),
+            para que en un cruce no se pierda la arista de salida correcta.
+
+    Returns:
+        List[Candidato]: Candidatos (u, v, fraccion, distancia) ordenados por distancia.
+    """
+    tam_celda = indice["tam_celda"]
+    margen_lat = radio / METROS_POR_GRADO
+    margen_lon = margen_lat / cos(radians(lat))
+
+    aristas = set()
+    for fila in range(int((lat - margen_lat) // tam_celda), int((lat + margen_lat) // tam_celda) + 1):
+        for columna in range(int((lon - margen_lon) // tam_celda), int((lon + margen_lon) // tam_celda) + 1):
+            aristas.update(indice.get((fila, columna), ()))
+
+    candidatos = []
+    for u, v in aristas:
+        fraccion, distancia = _proyecta(lat, lon, G.nodes[u]["y"], G.nodes[u]["x"], G.nodes[v]["y"], G.nodes[v]["x"])
+        if distancia <= radio:
+            candidatos.append((u, v, fraccion, distancia))
+
+    candidatos.sort(key=lambda c: c[3])
+    calles = set()
+    seleccion = []
+    for candidato in candidatos:
+        calle = frozenset(candidato[:2])
+        if calle not in calles:
+            if len(calles) == max_candidatos:
+                continue
+            calles.add(calle)
+        seleccion.append(candidato)
+    return seleccion
+
+
+def _arbol_acotado(G: nx.DiGraph, origen: object, memo: dict, distancia_maxima: float, tam_memo: int) -> Tuple[dict, dict]:
+    """Dijkstra acotado desde "origen" con memoización (se vacía al superar tam_memo entradas)."""
+    if origen not in memo:
+        if len(memo) >= tam_memo:
+            memo.clear()
+        memo[origen] = dijkstra_acotado(G, calcula_peso_longitud, origen, distancia_maxima)
+    return memo[origen]
+
+
+def _distancia_ruta(G: nx.DiGraph, a: Candidato, b: Candidato, memo: dict, distancia_maxima: float, tam_memo: int) -> float:
+    """Distancia por carretera entre dos candidatos, o None si supera distancia_maxima."""
+    u1, v1, f1, _ = a
+    u2, v2, f2, _ = b
+    if (u1, v1) == (u2, v2) and f2 >= f1:
+        return (f2 - f1) * calcula_peso_longitud(G, u1, v1)
+
+    dist, _ = _arbol_acotado(G, v1, memo, distancia_maxima, tam_memo)
+    if u2 not in dist:
+        return None
+    return (1 - f1) * calcula_peso_longitud(G, u1, v1) + dist[u2] + f2 * calcula_peso_longitud(G, u2, v2)
+
+
+def _aristas_tramo(G: nx.DiGraph, secuencia: List[Candidato], memo: dict, distancia_maxima: float, tam_memo: int) -> List[Tuple[object, object]]:
+    """Convierte la secuencia de candidatos elegida por Viterbi en una lista de aristas consecutivas."""
+    aristas = [secuencia[0][:2]]
+    for a, b in zip(secuencia, secuencia[1:]):
+        if a[:2] == b[:2] and b[2] >= a[2]:
+            continue
+        _, padre = _arbol_acotado(G, a[1], memo, distancia_maxima, tam_memo)
+        camino = []
+        actual = b[0]
+        while actual is not None:
+            camino.append(actual)
+            actual = padre[actual]
+        camino.reverse()
+        aristas.extend(zip(camino, camino[1:]))
+        aristas.append(b[:2])
+    return aristas
+
+
+def ajusta_traza(G: nx.DiGraph, puntos: Iterable[Tuple[float, float]], indice: dict, sigma: float = 10, beta: float = 50,
+                 radio: float = 50, max_candidatos: int = 5, distancia_maxima: float = 2000, memo: dict = None,
+                 tam_memo: int = 100000) -> List[List[Tuple[object, object]]]:
+    """
+    Ajusta una traza GPS al grafo de calles con un modelo oculto de Markov (Newson y Krumm):
+        - Emisión: gaussiana sobre la distancia del punto a la arista candidata (desviación sigma).
+        - Transición: exponencial sobre la diferencia entre la distancia por carretera y la distancia
+          en línea recta entre puntos consecutivos (escala beta). Las distancias por carretera se calculan
+          con Dijkstra acotado a distancia_maxima y se memorizan por nodo de salida.
+    Los puntos sin candidatos se descartan. Si ningún candidato es alcanzable desde el punto anterior,
+    la traza se corta y se empieza un tramo nuevo.
+
+    Args:
+        G (nx.DiGraph): Grafo de calles con atributo "length" en las aristas.
+        puntos (Iterable[Tuple[float, float]]): Puntos (latitud, longitud) en orden temporal. Puede ser un generador.
+        indice (dict): Índice devuelto por construye_indice_aristas.
+        sigma (float): Desviación típica del error GPS en metros.
+        beta (float): Escala de la probabilidad de transición en metros.
+        radio (float): Radio de búsqueda de candidatos en metros.
+        max_candidatos (int): Número máximo de calles candidatas por punto (ver busca_candidatos).
+        distancia_maxima (float): Distancia máxima por carretera entre dos puntos consecutivos.
+        memo (dict, opcional): Caché de árboles de Dijkstra compartida entre trazas.
+        tam_memo (int): Número máximo de árboles en la caché.
+
+    Returns:
+        List[List[Tuple[object, object]]]: Lista de tramos; cada tramo es una lista de aristas (u, v)
+            consecutivas que puede convertirse en ruta con ruta_desde_aristas.
+    """
+    memo = {} if memo is None else memo
+    tramos = []
+    capas = []  # Para cada punto: (candidatos, retroceso al índice del candidato anterior)
+    puntuacion = []
+    punto_anterior = None
+
+    def cierra_tramo():
+        if not capas:
+            return
+        j = max(range(len(puntuacion)), key=puntuacion.__getitem__)
+        secuencia = []
+        for candidatos, retroceso in reversed(capas):
+            secuencia.append(candidatos[j])
+            j = retroceso[j]
+        secuencia.reverse()
+        tramos.append(_aristas_tramo(G, secuencia, memo, distancia_maxima, tam_memo))
+
+    for lat, lon in puntos:
+        candidatos = busca_candidatos(G, indice, lat, lon, radio, max_candidatos)
+        if not candidatos:
+            continue
+        emision = [-0.5 * (c[3] / sigma) ** 2 for c in candidatos]
+
+        nueva, retroceso = [], []
+        if capas:
+            recta = _distancia_puntos(*punto_anterior, lat, lon)
+            for j, b in enumerate(candidatos):
+                mejor, arg = float("-inf"), None
+                for i, a in enumerate(capas[-1][0]):
+                    if puntuacion[i] == float("-inf"):
+                        continue
+                    d = _distancia_ruta(G, a, b, memo, distancia_maxima, tam_memo)
+                    if d is None:
+                        continue
+                    valor = puntuacion[i] - abs(d - recta) / beta
+                    if valor > mejor:
+                        mejor, arg = valor, i
+                nueva.append(mejor + emision[j])
+                retroceso.append(arg)
+
+        if not capas or all(p == float("-inf") for p in nueva):
+            # Inicio de traza o ruptura del modelo: se cierra el tramo anterior y se empieza otro
+            cierra_tramo()
+            capas = []
+            nueva, retroceso = emision, [None] * len(candidatos)
+
+        capas.append((candidatos, retroceso))
+        puntuacion = nueva
+        punto_anterior = (lat, lon)
+
+    cierra_tramo()
+    return tramos
+
+
+def ruta_desde_aristas(aristas: List[Tuple[object, object]]) -> list:
+    """Convierte una lista de aristas consecutivas en la lista de nodos que usa genera_instrucciones."""
+    ruta = [aristas[0][0]] if aristas else []
+    for u, v in aristas:
+        if ruta[-1] != u:
+            ruta.append(u)
+        if ruta[-1] != v:
+            ruta.append(v)
+    return ruta
+
+
+def agrupa_pings(pings: Iterable[Tuple[object, float, float]]) -> Iterator[Tuple[object, Iterator[Tuple[float, float]]]]:
+    """
+    Agrupa un flujo de pings (id_vehiculo, latitud, longitud), ordenado por vehículo y tiempo,
+    en trazas (id_vehiculo, puntos) sin cargarlo en memoria.
+    """
+    for id_vehiculo, grupo in itertools.groupby(pings, key=lambda ping: ping[0]):
+        yield id_vehiculo, ((lat, lon) for _, lat, lon in grupo)
+
+
+# Estado de cada proceso trabajador: el grafo, el índice y la caché se crean una vez por proceso
+_GRAFO = None
+_INDICE = None
+_MEMO = {}
+_PARAMETROS = {}
+
+
+def _inicializa_trabajador(G: nx.DiGraph, indice: dict, parametros: dict):
+    global _GRAFO, _INDICE, _MEMO, _PARAMETROS
+    _GRAFO, _INDICE, _MEMO, _PARAMETROS = G, indice, {}, parametros
+
+
+def _ajusta_en_trabajador(traza: Tuple[object, List[Tuple[float, float]]]):
+    id_traza, puntos = traza
+    return id_traza, ajusta_traza(_GRAFO, puntos, _INDICE, memo=_MEMO, **_PARAMETROS)
+
+
+def ajusta_trazas(G: nx.DiGraph, trazas: Iterable[Tuple[object, Iterable[Tuple[float, float]]]], indice: dict = None,
+                  procesos: int = None, tam_lote: int = 1000, **parametros) -> Iterator[Tuple[object, List[List[Tuple[object, object]]]]]:
+    """
+    Ajusta en paralelo un flujo de trazas GPS. Las trazas se leen por lotes de tam_lote para que
+    la memoria no dependa de la longitud del flujo, y cada proceso conserva su propia caché de
+    árboles de Dijkstra entre trazas.
+
+    Args:
+        G (nx.DiGraph): Grafo de calles.
+        trazas (Iterable): Pares (id_traza, puntos), por ejemplo los generados por agrupa_pings.
+        indice (dict, opcional): Índice de aristas; si no se indica se construye con construye_indice_aristas.
+        procesos (int, opcional): Número de procesos; por defecto, el número de CPUs. Con 1 no se crean procesos.
+        tam_lote (int): Número de trazas leídas del flujo en cada lote.
+        **parametros: Parámetros adicionales de ajusta_traza (sigma, beta, radio, max_candidatos, distancia_maxima, tam_memo).
+
+    Returns:
+        Iterator[Tuple[object, List[List[Tuple[object, object]]]]]: Pares (id_traza, tramos) en el orden de entrada.
+    """
+    indice = construye_indice_aristas(G) if indice is None else indice
+    trazas = iter(trazas)
+
+    if procesos == 1:
+        memo = {}
+        for id_traza, puntos in trazas:
+            yield id_traza, ajusta_traza(G, puntos, indice, memo=memo, **parametros)
+        return
+
+    procesos = procesos or os.cpu_count()
+    with multiprocessing.Pool(procesos, _inicializa_trabajador, (G, indice, parametros)) as pool:
+        while True:
+            # Los generadores de puntos no se pueden enviar a otro proceso: se materializa cada traza del lote
+            lote = [(id_traza, list(puntos)) for id_traza, puntos in itertools.islice(trazas, tam_lote)]
+            if not lote:
+                break
+            yield from pool.imap(_ajusta_en_trabajador, lote, chunksize=max(1, len(lote) // (4 * procesos)))
@@ -18,15 +18,24 @@ Complétese esta descripción según las funcionalidades agregadas por el grupo.
 import osmnx as ox
 import networkx as nx
 import pandas as pd
+import numpy as np
 import os
 import re
+import json
+import bz2
+import gzip
+import xml.etree.ElementTree as ET
 import matplotlib.pyplot as plt
-from typing import Tuple
+from math import radians, sin, cos, asin, sqrt
+from typing import Tuple, Iterator, Dict, Union
 
 STREET_FILE_NAME="direcciones.csv"
 
 PLACE_NAME = "Madrid, Spain"
 MAP_FILE_NAME="madrid.graphml"
+PROFILES_FILE_NAME="perfiles_velocidad.json"
+
+RADIO_TIERRA = 6371009  # Radio medio de la Tierra en metros (el mismo que usa OSMnx)
 
 MAX_SPEEDS={'living_street': '20',
  'residential': '30',
@@ -167,21 +176,286 @@ def busca_direccion(direccion:str, callejero:pd.DataFrame) -> Tuple[float,float]
     return latitud, longitud
 
 
+def _proyecta_metros(lat: np.ndarray, lon: np.ndarray, lat_ref: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Proyección equirectangular local (en metros) alrededor de la latitud lat_ref."""
+    metros_por_grado = np.radians(1) * RADIO_TIERRA
+    return lon * metros_por_grado * np.cos(np.radians(lat_ref)), lat * metros_por_grado
+
+
+def _clave_celda(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    """Codifica las coordenadas enteras de una celda de la rejilla en un único entero de 64 bits."""
+    return (cx.astype(np.int64) << 32) | (cy.astype(np.int64) + 2**31)
+
+
+def _construye_nivel(x: np.ndarray, y: np.ndarray, tam_celda: float) -> dict:
+    """Rejilla de lado tam_celda: portales ordenados por celda y rango [inicio, inicio + cuenta) de cada celda."""
+    claves = _clave_celda(np.floor(x / tam_celda), np.floor(y / tam_celda))
+    orden = np.argsort(claves, kind="stable")
+    claves_unicas, inicios, cuentas = np.unique(claves[orden], return_index=True, return_counts=True)
+    return {
+        "tam_celda": tam_celda,
+        "x": x[orden],
+        "y": y[orden],
+        "filas": orden,  # Posición en el callejero de cada portal ordenado
+        "claves": claves_unicas,
+        "inicios": inicios,
+        "cuentas": cuentas,
+    }
+
+
+def construye_indice_callejero(callejero: pd.DataFrame, tam_celda: float = 100, niveles: int = 8) -> dict:
+    """
+    Construye un índice espacial sobre las columnas LATITUD y LONGITUD del callejero: varias
+    rejillas, de lado tam_celda, 4 * tam_celda, 16 * tam_celda... Los puntos dentro de la ciudad
+    se resuelven en la rejilla fina y los alejados en las gruesas. En cada rejilla los portales se
+    ordenan por celda para que cada celda sea un rango contiguo de los arrays.
+    Se construye una sola vez y se reutiliza en todas las búsquedas inversas.
+
+    Args:
+        callejero (DataFrame): DataFrame devuelto por carga_callejero.
+        tam_celda (float): Lado de las celdas de la rejilla más fina, en metros.
+        niveles (int): Número de rejillas.
+
+    Returns:
+        dict: Índice con la latitud de referencia de la proyección y la lista de rejillas.
+
+    Raises:
+        ValueError: Si el callejero está vacío.
+    """
+    if callejero.empty:
+        raise ValueError("El callejero está vacío.")
+
+    lat = callejero["LATITUD"].to_numpy(dtype=float)
+    lon = callejero["LONGITUD"].to_numpy(dtype=float)
+    lat_ref = float(lat.mean())
+    x, y = _proyecta_metros(lat, lon, lat_ref)
+
+    return {
+        "lat_ref": lat_ref,
+        "niveles": [_construye_nivel(x, y, tam_celda * 4 ** i) for i in range(niveles)],
+    }
+
+
+def _explora_celda(nivel: dict, qx: np.ndarray, qy: np.ndarray, cx: np.ndarray, cy: np.ndarray,
+                   consultas: np.ndarray, mejor: np.ndarray, mejor_d2: np.ndarray):
+    """Actualiza (mejor, mejor_d2) de las consultas indicadas con los portales de la celda (cx, cy) de cada una."""
+    x, y, claves = nivel["x"], nivel["y"], nivel["claves"]
+    k = _clave_celda(cx, cy)
+    pos = np.minimum(np.searchsorted(claves, k), len(claves) - 1)
+    cuentas = np.where(claves[pos] == k, nivel["cuentas"][pos], 0)
+    total = int(cuentas.sum())
+    if total == 0:
+        return
+
+    # Expandir cada consulta a todos los portales de su celda
+    consulta = np.repeat(consultas, cuentas)
+    desplazamiento = np.arange(total) - np.repeat(np.cumsum(cuentas) - cuentas, cuentas)
+    portal = np.repeat(nivel["inicios"][pos], cuentas) + desplazamiento
+    d2 = (x[portal] - qx[consulta]) ** 2 + (y[portal] - qy[consulta]) ** 2
+
+    # Mínimo por consulta: los candidatos de cada consulta son contiguos, basta reduceat por grupos
+    hay = cuentas > 0
+    grupos = (np.cumsum(cuentas) - cuentas)[hay]
+    minimo = np.minimum.reduceat(d2, grupos)
+    es_minimo = np.flatnonzero(d2 == np.repeat(minimo, cuentas[hay]))
+    primero = es_minimo[np.r_[True, consulta[es_minimo[1:]] != consulta[es_minimo[:-1]]]]
+    consulta, portal, d2 = consulta[primero], portal[primero], d2[primero]
+    mejora = d2 < mejor_d2[consulta]
+    mejor_d2[consulta[mejora]] = d2[mejora]
+    mejor[consulta[mejora]] = portal[mejora]
+
+
+def _vecino_mas_cercano(indice: dict, qx: np.ndarray, qy: np.ndarray, max_anillos: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """Para cada punto proyectado devuelve (fila del callejero, distancia al cuadrado) del portal más cercano."""
+    n = len(qx)
+    mejor_d2 = np.full(n, np.inf)
+    mejor = np.full(n, -1, dtype=np.int64)
+    filas = np.full(n, -1, dtype=np.int64)
+    pendientes = np.arange(n)
+
+    for nivel in indice["niveles"]:
+        tam_celda = nivel["tam_celda"]
+        cx, cy = np.floor(qx / tam_celda), np.floor(qy / tam_celda)
+        # Las posiciones de "mejor" son propias de cada rejilla: se reinicia la búsqueda en la nueva
+        mejor_d2[pendientes] = np.inf
+
+        # Se exploran anillos de celdas alrededor de cada punto. Tras el anillo r, cualquier portal
+        # no visitado está a más de r * tam_celda metros, así que los puntos con un portal más
+        # cercano que eso ya tienen su respuesta definitiva
+        for r in range(max_anillos + 1):
+            if r == 0:
+                anillo = [(0, 0)]
+            else:
+                anillo = [(dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1) if max(abs(dx), abs(dy)) == r]
+            for dx, dy in anillo:
+                _explora_celda(nivel, qx, qy, cx[pendientes] + dx, cy[pendientes] + dy, pendientes, mejor, mejor_d2)
+            resuelto = mejor_d2[pendientes] <= (r * tam_celda) ** 2
+            filas[pendientes[resuelto]] = nivel["filas"][mejor[pendientes[resuelto]]]
+            pendientes = pendientes[~resuelto]
+            if len(pendientes) == 0:
+                return filas, mejor_d2
+
+    # Puntos más allá de la rejilla más gruesa: búsqueda exhaustiva
+    nivel = indice["niveles"][0]
+    x, y = nivel["x"], nivel["y"]
+    for i in pendientes:
+        d2 = (x - qx[i]) ** 2 + (y - qy[i]) ** 2
+        mejor_i = int(np.argmin(d2))
+        filas[i], mejor_d2[i] = nivel["filas"][mejor_i], d2[mejor_i]
+
+    return filas, mejor_d2
+
+
+def busca_direcciones_inversas(latitudes, longitudes, callejero: pd.DataFrame, indice: dict = None, tam_lote: int = 200000) -> pd.DataFrame:
+    """
+    Geocodificación inversa por lotes: para cada par (latitud, longitud) busca el portal más
+    cercano del callejero. Los cálculos están vectorizados con NumPy y se hacen por lotes de
+    tam_lote puntos para acotar la memoria.
+
+    Args:
+        latitudes (array-like): Latitudes en grados.
+        longitudes (array-like): Longitudes en grados.
+        callejero (DataFrame): DataFrame devuelto por carga_callejero.
+        indice (dict, opcional): Índice de construye_indice_callejero. Si no se indica se construye,
+            pero conviene construirlo una vez y reutilizarlo.
+        tam_lote (int): Número de puntos procesados a la vez.
+
+    Returns:
+        DataFrame: Una fila por punto, en el mismo orden, con las columnas DIRECCION, LATITUD y LONGITUD
+            del portal más cercano y DISTANCIA (metros) hasta él. Los puntos con latitud o longitud no
+            finita (NaN, inf: posiciones sin señal GPS) no se buscan: su DIRECCION es None y LATITUD,
+            LONGITUD y DISTANCIA son NaN.
+
+    Raises:
+        ValueError: Si latitudes y longitudes no tienen la misma longitud o el callejero está vacío.
+    """
+    latitudes = np.asarray(latitudes, dtype=float).ravel()
+    longitudes = np.asarray(longitudes, dtype=float).ravel()
+    if latitudes.shape != longitudes.shape:
+        raise ValueError("Las latitudes y longitudes deben tener la misma longitud.")
+    if indice is None:
+        indice = construye_indice_callejero(callejero)
+
+    # Los puntos sin coordenadas válidas se excluyen antes de proyectar para no asignarles un portal cualquiera
+    validos = np.flatnonzero(np.isfinite(latitudes) & np.isfinite(longitudes))
+    posiciones = np.empty(len(validos), dtype=np.int64)
+    distancias = np.full(len(latitudes), np.nan)
+    for inicio in range(0, len(validos), tam_lote):
+        lote = validos[inicio:inicio + tam_lote]
+        qx, qy = _proyecta_metros(latitudes[lote], longitudes[lote], indice["lat_ref"])
+        filas, mejor_d2 = _vecino_mas_cercano(indice, qx, qy)
+        posiciones[inicio:inicio + tam_lote] = filas
+        distancias[lote] = np.sqrt(mejor_d2)
+
+    encontrados = callejero[["DIRECCION", "LATITUD", "LONGITUD"]].iloc[posiciones]
+    resultado = pd.DataFrame({
+        "DIRECCION": np.full(len(latitudes), None, dtype=object),
+        "LATITUD": np.full(len(latitudes), np.nan),
+        "LONGITUD": np.full(len(latitudes), np.nan),
+    })
+    resultado.loc[validos, "DIRECCION"] = encontrados["DIRECCION"].to_numpy(dtype=object)
+    resultado.loc[validos, "LATITUD"] = encontrados["LATITUD"].to_numpy(dtype=float)
+    resultado.loc[validos, "LONGITUD"] = encontrados["LONGITUD"].to_numpy(dtype=float)
+    resultado["DISTANCIA"] = distancias
+    return resultado
+
+
+def busca_direccion_inversa(latitud: float, longitud: float, callejero: pd.DataFrame, indice: dict = None) -> Tuple[str, float]:
+    """ Función inversa de busca_direccion: devuelve la dirección del callejero más cercana
+    a unas coordenadas y la distancia hasta ella
+    
+    Args:
+        latitud (float): Latitud en grados
+        longitud (float): Longitud en grados
+        callejero (DataFrame): DataFrame con la información de las calles
+        indice (dict, opcional): Índice de construye_indice_callejero
+    Returns:
+        Tuple[str,float]: Par (dirección, distancia en metros); (None, nan) si alguna coordenada no es finita
+    Example:
+        busca_direccion_inversa(40.42998055555555,-3.7112583333333333, data)=("CALLE DE ALBERTO AGUILERA, 23", 0.0)
+    """
+    resultado = busca_direcciones_inversas([latitud], [longitud], callejero, indice)
+    return resultado.at[0, "DIRECCION"], float(resultado.at[0, "DISTANCIA"])
+
+
 ############## Parte 4 ##############
 
 
-def carga_grafo() -> nx.MultiDiGraph:
+def carga_perfiles_velocidad(fichero: str = PROFILES_FILE_NAME) -> dict:
+    """
+    Carga los perfiles de velocidad por hora del día desde un fichero JSON local de la forma:
+
+        {
+            "perfiles": [[[0, 1.0], [7.5, 0.45], [10, 0.8], ..., [24, 1.0]], ...],
+            "highway": {"primary": 1, "residential": 0, ...},
+            "aristas": {"21734342,25906112": 2, ...}
+        }
+
+    Cada perfil es una lista de puntos (hora, factor) que se interpolan linealmente, y el factor
+    multiplica la velocidad libre (maxspeed) de la arista. Los perfiles se comparten: "highway" asigna
+    un identificador de perfil a cada tipo de vía y "aristas" (opcional) lo sustituye en aristas concretas.
+
+    Args:
+        fichero (str): Ruta al fichero JSON de perfiles.
+
+    Returns:
+        dict: Perfiles en forma compacta: "perfiles" es una lista de pares de tuplas (segundos, factores),
+            "highway" un diccionario tipo -> id y "aristas" un diccionario (u, v) -> id.
+
+    Raises:
+        FileNotFoundError: Si el fichero no existe.
+        ValueError: Si algún perfil no es válido o alguna clave de "aristas" no es un par "u,v" de ids enteros.
+    """
+    try:
+        with open(fichero, encoding="utf-8") as f:
+            datos = json.load(f)
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"El fichero de perfiles '{fichero}' no existe. Por favor, verifique la ruta del archivo.") from e
+
+    perfiles = []
+    for id_perfil, puntos in enumerate(datos["perfiles"]):
+        horas = tuple(float(hora) * 3600 for hora, _ in puntos)
+        factores = tuple(float(factor) for _, factor in puntos)
+        if len(horas) < 2 or horas[0] != 0 or horas[-1] != 24 * 3600:
+            raise ValueError(f"El perfil {id_perfil} debe empezar en la hora 0 y terminar en la hora 24.")
+        if any(h1 >= h2 for h1, h2 in zip(horas, horas[1:])):
+            raise ValueError(f"Las horas del perfil {id_perfil} deben ser estrictamente crecientes.")
+        if any(factor <= 0 for factor in factores):
+            raise ValueError(f"Los factores del perfil {id_perfil} deben ser positivos.")
+        perfiles.append((horas, factores))
+
+    aristas = {}
+    for clave, id_perfil in datos.get("aristas", {}).items():
+        nodos = [nodo.strip() for nodo in clave.split(",")]
+        if len(nodos) != 2 or not all(nodo.isdigit() for nodo in nodos):
+            raise ValueError(f"Clave de arista no válida: {clave}")
+        aristas[(int(nodos[0]), int(nodos[1]))] = int(id_perfil)
+
+    highway = {tipo: int(id_perfil) for tipo, id_perfil in datos.get("highway", {}).items()}
+    for id_perfil in list(highway.values()) + list(aristas.values()):
+        if not 0 <= id_perfil < len(perfiles):
+            raise ValueError(f"El perfil {id_perfil} no existe.")
+
+    return {"perfiles": perfiles, "highway": highway, "aristas": aristas}
+
+
+def carga_grafo(extracto: str = None) -> Union[nx.MultiDiGraph, nx.DiGraph]:
     """Función que recupera el quiver de calles de Madrid de OpenStreetMap.
     
     Args:
-        None
+        extracto (str, opcional): Ruta a un extracto local de OSM (.osm, .osm.bz2, .osm.gz o .pbf).
+            Si se indica, el grafo se construye sin conexión con carga_grafo_extracto.
     
     Returns:
-        nx.MultiDiGraph: Quiver de las calles de Madrid.
+        Union[nx.MultiDiGraph, nx.DiGraph]: Quiver de las calles de Madrid. Si se usa un extracto se devuelve
+            directamente el nx.DiGraph compacto (procesa_grafo lo acepta tal cual).
     
     Raises:
         ServiceNotAvailableError: Si no es posible recuperar el grafo de OpenStreetMap.
     """
+    if extracto is not None:
+        return carga_grafo_extracto(extracto)
+
     fichero = 'madrid.graphml'
     try:
         if os.path.exists(fichero):
@@ -213,8 +487,11 @@ def procesa_grafo(multidigrafo: nx.MultiDiGraph) -> nx.DiGraph:
         nx.DiGraph: Grafo dirigido (DiGraph) simplificado, sin bucles ni aristas redundantes.
     """
     try:
-        # Convertir a digrafo y eliminar bucles
-        digrafo = ox.utils_graph.convert.to_digraph(multidigrafo)
+        # Convertir a digrafo y eliminar bucles (los grafos de carga_grafo_extracto ya son digrafos)
+        if multidigrafo.is_multigraph():
+            digrafo = ox.utils_graph.convert.to_digraph(multidigrafo)
+        else:
+            digrafo = multidigrafo.copy()
         bucles = list(nx.selfloop_edges(digrafo)) 
         digrafo.remove_edges_from(bucles)  
 
@@ -224,3 +501,172 @@ def procesa_grafo(multidigrafo: nx.MultiDiGraph) -> nx.DiGraph:
 
     except Exception as e:
         raise RuntimeError(f"Error al procesar el grafo: {str(e)}") from e
+
+
+def _distancia_haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia en metros sobre la esfera terrestre entre dos puntos dados en grados."""
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    h = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA * asin(min(1.0, sqrt(h)))
+
+
+def _es_via_conducible(etiquetas: Dict[str, str]) -> bool:
+    """Indica si una vía de OSM pertenece a la red de conducción (tipos de MAX_SPEEDS)."""
+    return (etiquetas.get("highway") in MAX_SPEEDS
+            and etiquetas.get("area") != "yes"
+            and etiquetas.get("access") not in ("no", "private")
+            and etiquetas.get("motor_vehicle") not in ("no", "private"))
+
+
+def _elementos_osm(fichero: str, tipo: str) -> Iterator[tuple]:
+    """
+    Recorre en streaming los elementos de un extracto de OSM sin cargar el fichero en memoria.
+
+    Args:
+        fichero (str): Ruta al extracto (.osm, .osm.bz2, .osm.gz o .pbf).
+        tipo (str): "node" o "way".
+
+    Returns:
+        Iterator[tuple]: Para "node" tuplas (id, lat, lon); para "way" tuplas (id, referencias, etiquetas).
+    """
+    if fichero.endswith(".pbf"):
+        # Dependencia opcional: solo hace falta para leer extractos en formato PBF
+        try:
+            import osmium
+        except ImportError as e:
+            raise ImportError("Para leer ficheros .pbf es necesario instalar pyosmium (pip install osmium).") from e
+
+        entidad = osmium.osm.NODE if tipo == "node" else osmium.osm.WAY
+        for obj in osmium.FileProcessor(fichero, entidad):
+            if tipo == "node" and obj.is_node():
+                yield obj.id, obj.location.lat, obj.location.lon
+            elif tipo == "way" and obj.is_way():
+                yield obj.id, [n.ref for n in obj.nodes], dict(obj.tags)
+        return
+
+    if fichero.endswith(".bz2"):
+        flujo = bz2.open(fichero, "rb")
+    elif fichero.endswith(".gz"):
+        flujo = gzip.open(fichero, "rb")
+    else:
+        flujo = open(fichero, "rb")
+
+    with flujo:
+        contexto = ET.iterparse(flujo, events=("start", "end"))
+        _, raiz = next(contexto)
+        for evento, elem in contexto:
+            if evento != "end" or elem.tag not in ("node", "way", "relation"):
+                continue
+            if elem.tag == tipo == "node":
+                yield int(elem.get("id")), float(elem.get("lat")), float(elem.get("lon"))
+            elif elem.tag == tipo == "way":
+                referencias = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                etiquetas = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                yield int(elem.get("id")), referencias, etiquetas
+            # Liberar el elemento ya procesado para que la memoria no crezca con el fichero
+            elem.clear()
+            raiz.clear()
+
+
+def carga_grafo_extracto(fichero: str) -> nx.DiGraph:
+    """
+    Construye el grafo de calles a partir de un extracto local de OpenStreetMap, sin conexión
+    y leyendo el fichero en streaming (la memoria depende del tamaño del grafo, no del XML).
+
+    Se hacen tres pasadas sobre el fichero:
+        1. Vías conducibles: se cuenta cuántas veces aparece cada nodo para detectar cruces y extremos.
+        2. Nodos: se guardan solo las coordenadas de los nodos usados por esas vías.
+        3. Vías conducibles: se generan las aristas entre cruces sumando la longitud de los tramos intermedios.
+
+    El resultado ya está en la forma compacta de procesa_grafo: un DiGraph sin bucles ni aristas
+    paralelas (se conserva la más corta), con los atributos que leen las funciones de peso de gps.py
+    ("length", "highway", "maxspeed", "name") y las coordenadas "x", "y" en los nodos.
+
+    Args:
+        fichero (str): Ruta al extracto (.osm, .osm.bz2, .osm.gz o .pbf).
+
+    Returns:
+        nx.DiGraph: Grafo dirigido de la red de conducción del extracto.
+
+    Raises:
+        FileNotFoundError: Si el fichero no existe.
+    """
+    if not os.path.exists(fichero):
+        raise FileNotFoundError(f"El extracto de OSM '{fichero}' no existe. Por favor, verifique la ruta del archivo.")
+
+    print("Construyendo grafo desde el extracto local de OSM...")
+
+    # Pasada 1: apariciones de cada nodo en vías conducibles (los extremos cuentan doble)
+    apariciones = {}
+    for _, referencias, etiquetas in _elementos_osm(fichero, "way"):
+        if len(referencias) < 2 or not _es_via_conducible(etiquetas):
+            continue
+        for ref in referencias:
+            apariciones[ref] = apariciones.get(ref, 0) + 1
+        apariciones[referencias[0]] += 1
+        apariciones[referencias[-1]] += 1
+
+    # Pasada 2: coordenadas de los nodos usados
+    coordenadas = {}
+    for id_nodo, lat, lon in _elementos_osm(fichero, "node"):
+        if id_nodo in apariciones:
+            coordenadas[id_nodo] = (lat, lon)
+
+    grafo = nx.DiGraph(crs="epsg:4326")
+
+    def añade_arista(u, v, longitud, id_via, etiquetas):
+        if u == v:
+            return
+        if grafo.has_edge(u, v) and grafo[u][v]["length"] <= longitud:
+            return
+        for nodo in (u, v):
+            if nodo not in grafo:
+                grafo.add_node(nodo, y=coordenadas[nodo][0], x=coordenadas[nodo][1])
+        datos = {"osmid": id_via, "highway": etiquetas["highway"], "length": longitud}
+        for clave in ("maxspeed", "name"):
+            if clave in etiquetas:
+                datos[clave] = etiquetas[clave]
+        # Una arista paralela más corta sustituye por completo a la anterior (add_edge solo actualizaría
+        # sus atributos y conservaría el maxspeed o el name de la vía descartada)
+        if grafo.has_edge(u, v):
+            grafo.remove_edge(u, v)
+        grafo.add_edge(u, v, **datos)
+
+    # Pasada 3: aristas entre nodos clave (cruces, extremos de vía o cortes del extracto)
+    for id_via, referencias, etiquetas in _elementos_osm(fichero, "way"):
+        if len(referencias) < 2 or not _es_via_conducible(etiquetas):
+            continue
+
+        sentido = etiquetas.get("oneway", "no")
+        if sentido in ("-1", "reverse"):
+            referencias = referencias[::-1]
+        un_sentido = (sentido in ("yes", "true", "1", "-1", "reverse")
+                      or etiquetas.get("junction") == "roundabout"
+                      or (etiquetas["highway"] == "motorway" and sentido not in ("no", "false", "0")))
+
+        def cierra_tramo(inicio, fin, longitud):
+            añade_arista(inicio, fin, longitud, id_via, etiquetas)
+            if not un_sentido:
+                añade_arista(fin, inicio, longitud, id_via, etiquetas)
+
+        inicio, anterior, longitud = None, None, 0.0
+        for ref in referencias:
+            if ref not in coordenadas:
+                # Nodo fuera del extracto: se corta la vía en el último nodo conocido
+                if inicio is not None and anterior != inicio:
+                    cierra_tramo(inicio, anterior, longitud)
+                inicio, anterior, longitud = None, None, 0.0
+                continue
+            if inicio is None:
+                inicio, anterior = ref, ref
+                continue
+            longitud += _distancia_haversine(*coordenadas[anterior], *coordenadas[ref])
+            anterior = ref
+            if apariciones[ref] > 1:
+                cierra_tramo(inicio, ref, longitud)
+                inicio, longitud = ref, 0.0
+
+        if inicio is not None and anterior != inicio:
+            cierra_tramo(inicio, anterior, longitud)
+
+    return grafo
@@ -4,19 +4,33 @@ gps.py
 Aplicación GPS que permite calcular rutas en el callejero de Madrid.
 """
 
+import os
+import sys
 import networkx as nx
 import matplotlib.pyplot as plt
 import osmnx as ox
 import pandas as pd
+import numpy as np
 from callejero import (
     carga_callejero,
     carga_grafo,
     procesa_grafo,
     busca_direccion,
-    MAX_SPEEDS
+    carga_perfiles_velocidad,
+    MAX_SPEEDS,
+    PROFILES_FILE_NAME
 )
-from grafo_pesado import camino_minimo
-from math import degrees, acos, sqrt
+from grafo_pesado import (
+    camino_minimo,
+    camino_minimo_dependiente_tiempo,
+    dijkstra_multiorigen,
+    componentes_fuertemente_conexas,
+    componente_mayor
+)
+from math import degrees, acos, sqrt, floor
+from bisect import bisect_right
+
+SEGUNDOS_DIA = 24 * 3600
 
 KMH_TO_MPS = 3.6  # Conversión de km/h a m/s
 
@@ -83,13 +97,76 @@ def calcula_peso_tiempo_esperado(G: nx.Graph, u, v) -> float:
     return tiempo_base + prob_parada * tiempo_semáforo
 
 
-def encuentra_nodo_mas_cercano(G: nx.Graph, lat: float, lon: float) -> object:
-    """Encuentra el nodo más cercano a unas coordenadas."""
+def tiempo_recorrido_perfil(perfil: tuple, salida: float, tiempo_libre: float) -> float:
+    """Tiempo que se tarda en recorrer una arista entrando en el instante "salida" (segundos desde
+       las 0:00 del primer día) si a velocidad libre se tardaría tiempo_libre segundos.
+       La velocidad es la libre multiplicada por el factor del perfil, que varía linealmente entre
+       sus puntos, así que se integra exactamente tramo a tramo. Como el modelo es de velocidad,
+       salir más tarde nunca hace llegar antes (propiedad FIFO).
+    """
+    horas, factores = perfil
+    dia = floor(salida / SEGUNDOS_DIA) * SEGUNDOS_DIA
+    t = salida - dia
+    restante = tiempo_libre
+    i = min(bisect_right(horas, t), len(horas) - 1) - 1
+
+    while True:
+        pendiente = (factores[i + 1] - factores[i]) / (horas[i + 1] - horas[i])
+        factor = factores[i] + pendiente * (t - horas[i])
+        duracion = horas[i + 1] - t
+        # Segundos de "tiempo libre" recorridos hasta el final del tramo: integral del factor
+        capacidad = factor * duracion + pendiente / 2 * duracion ** 2
+        if capacidad >= restante:
+            # Resolver (pendiente / 2) * tau^2 + factor * tau = restante de forma estable
+            tau = 2 * restante / (factor + sqrt(max(0.0, factor ** 2 + 2 * pendiente * restante)))
+            return dia + t + tau - salida
+        restante -= capacidad
+        t = horas[i + 1]
+        i += 1
+        if i == len(horas) - 1:
+            i, t, dia = 0, 0.0, dia + SEGUNDOS_DIA
+
+
+def crea_peso_tiempo_dependiente(perfiles: dict, semaforos: bool = False):
+    """Devuelve una función de peso peso(G, u, v, t) para camino_minimo_dependiente_tiempo.
+       El perfil de cada arista se busca primero por arista y después por tipo de vía (highway);
+       las aristas sin perfil van siempre a velocidad libre (calcula_peso_tiempo).
+       Con semaforos=True se añade la misma penalización que calcula_peso_tiempo_esperado.
+    """
+    por_arista = perfiles["aristas"]
+    por_tipo = perfiles["highway"]
+    lista = perfiles["perfiles"]
+
+    def peso(G: nx.Graph, u, v, t: float) -> float:
+        id_perfil = por_arista.get((u, v))
+        if id_perfil is None:
+            highway = G[u][v].get("highway", "")
+            if isinstance(highway, list):
+                highway = highway[0] if highway else ""
+            id_perfil = por_tipo.get(highway)
+
+        tiempo_libre = calcula_peso_tiempo(G, u, v)
+        tiempo = tiempo_libre if id_perfil is None else tiempo_recorrido_perfil(lista[id_perfil], t, tiempo_libre)
+        if semaforos:
+            tiempo += calcula_peso_tiempo_esperado(G, u, v) - tiempo_libre
+        return tiempo
+
+    return peso
+
+
+def encuentra_nodo_mas_cercano(G: nx.Graph, lat: float, lon: float, componentes: dict = None) -> object:
+    """Encuentra el nodo más cercano a unas coordenadas.
+       Si se pasa el etiquetado de componentes fuertemente conexas, solo se consideran los nodos
+       de la componente más grande, de modo que cualquier par de nodos encontrados tenga ruta.
+    """
     menor_distancia = float("inf")
     nodo_cercano = None
+    etiqueta = componente_mayor(componentes) if componentes is not None else None
 
     # Iterar todos los nodos y encontrar el que este mas cerca de la latituda y longitud dad.
     for nodo, data in G.nodes(data=True):
+        if etiqueta is not None and componentes.get(nodo) != etiqueta:
+            continue
         distancia = ((data["y"] - lat) ** 2 + (data["x"] - lon) ** 2) ** 0.5
         if distancia < menor_distancia:
             menor_distancia = distancia
@@ -98,6 +175,69 @@ def encuentra_nodo_mas_cercano(G: nx.Graph, lat: float, lon: float) -> object:
     return nodo_cercano
 
 
+def asigna_instalaciones(G: nx.Graph, direcciones: list, callejero: pd.DataFrame, peso, componentes: dict = None):
+    """
+    Asigna cada nodo del grafo a la instalación más cercana (por ejemplo, un almacén) con un único
+    Dijkstra multiorigen, en vez de uno por instalación.
+
+    Args:
+        G (nx.Graph): Grafo de calles.
+        direcciones (list): Direcciones de las instalaciones en el formato de busca_direccion.
+        callejero (pd.DataFrame): DataFrame devuelto por carga_callejero.
+        peso (Callable): Función de peso (calcula_peso_longitud, calcula_peso_tiempo...).
+        componentes (dict, opcional): Etiquetado de componentes_fuertemente_conexas; si se indica,
+            las instalaciones se sitúan en la componente más grande.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]:
+            - Asignación: una fila por nodo alcanzable (índice = nodo) con INSTALACION y COSTE.
+            - Estadísticas: una fila por instalación con NODO, NODOS (tamaño del área de influencia),
+              COSTE_MEDIO y COSTE_MAXIMO. Las instalaciones que caen en el mismo nodo que otra anterior
+              tienen un área vacía.
+
+    Raises:
+        AdressNotFoundError: Si alguna dirección no existe en el callejero.
+    """
+    coordenadas = [busca_direccion(direccion, callejero) for direccion in direcciones]
+    nodos = dict(zip(direcciones, encuentra_nodos_mas_cercanos(G, coordenadas, componentes)))
+
+    # Si dos instalaciones caen en el mismo nodo, el nodo se asigna a la primera
+    instalacion_de_nodo = {}
+    for direccion, nodo in nodos.items():
+        instalacion_de_nodo.setdefault(nodo, direccion)
+
+    coste, fuente = dijkstra_multiorigen(G, peso, list(instalacion_de_nodo))
+    asignacion = pd.DataFrame({
+        "INSTALACION": [instalacion_de_nodo[fuente[nodo]] for nodo in coste],
+        "COSTE": list(coste.values()),
+    }, index=list(coste))
+
+    estadisticas = asignacion.groupby("INSTALACION")["COSTE"].agg(NODOS="size", COSTE_MEDIO="mean", COSTE_MAXIMO="max")
+    estadisticas = estadisticas.reindex(list(nodos)).fillna({"NODOS": 0}).astype({"NODOS": int})
+    estadisticas.insert(0, "NODO", [nodos[direccion] for direccion in estadisticas.index])
+    estadisticas.index.name = "INSTALACION"
+
+    return asignacion, estadisticas
+
+
+def encuentra_nodos_mas_cercanos(G: nx.Graph, puntos: list, componentes: dict = None) -> list:
+    """Versión por lotes de encuentra_nodo_mas_cercano: recorre los nodos una sola vez para construir
+       los arrays de coordenadas y resuelve cada punto (lat, lon) con NumPy, con la misma distancia.
+       La componente más grande se calcula una sola vez para todos los puntos.
+    """
+    etiqueta = componente_mayor(componentes) if componentes is not None else None
+    nodos, ys, xs = [], [], []
+    for nodo, data in G.nodes(data=True):
+        if etiqueta is not None and componentes.get(nodo) != etiqueta:
+            continue
+        nodos.append(nodo)
+        ys.append(data["y"])
+        xs.append(data["x"])
+    ys, xs = np.array(ys), np.array(xs)
+
+    return [nodos[int(np.argmin((ys - lat) ** 2 + (xs - lon) ** 2))] for lat, lon in puntos]
+
+
 def calcular_angulo_y_giro(p1: tuple, p2: tuple, p3: tuple, umbral_angulo=5):
     """
     Calcula el ángulo y determina si es un giro a la izquierda, derecha o movimiento recto.
@@ -224,11 +364,19 @@ def obtener_coordenadas(direccion: str, callejero: pd.DataFrame):
         return None
 
 
-def calcular_y_mostrar_ruta(grafo, origen, destino, peso_funcion):
-    """Calcula la ruta entre dos nodos y muestra las instrucciones y visualización."""
+def calcular_y_mostrar_ruta(grafo, origen, destino, peso_funcion, componentes=None, salida=None):
+    """Calcula la ruta entre dos nodos y muestra las instrucciones y visualización.
+       Si se indica la hora de salida (segundos desde las 0:00), peso_funcion depende del tiempo.
+    """
     try:
         # Calcular ruta segun la opcion elegida (varía peso_funcion)
-        ruta = camino_minimo(grafo, peso_funcion, origen, destino)
+        if salida is None:
+            ruta = camino_minimo(grafo, peso_funcion, origen, destino, componentes)
+        else:
+            ruta, llegada = camino_minimo_dependiente_tiempo(grafo, peso_funcion, origen, destino, salida, componentes)
+            llegada = int(llegada) % SEGUNDOS_DIA
+            print(f"Duración estimada: {int((llegada - salida) % SEGUNDOS_DIA) // 60} minutos "
+                  f"(llegada a las {llegada // 3600:02d}:{llegada % 3600 // 60:02d}).")
         print("Ruta calculada exitosamente.")
         
         # Generar instrucciones para el usuario (lista de strings)
@@ -249,7 +397,13 @@ def main():
 
     print("Cargando datos...")
     callejero = carga_callejero()
-    grafo = procesa_grafo(carga_grafo())
+    # Opcionalmente, un extracto local de OSM pasado por línea de comandos (construcción sin conexión)
+    extracto = sys.argv[1] if len(sys.argv) > 1 else None
+    grafo = procesa_grafo(carga_grafo(extracto))
+    # Componentes fuertemente conexas: permiten descartar al instante pares sin ruta (calles de sentido único sin salida)
+    componentes = componentes_fuertemente_conexas(grafo)
+    # Perfiles de velocidad por hora del día (opcionales): permiten calcular rutas según la hora de salida
+    peso_hora = crea_peso_tiempo_dependiente(carga_perfiles_velocidad()) if os.path.exists(PROFILES_FILE_NAME) else None
     print("Datos cargados correctamente. Puede empezar a planificar su ruta.")
 
     while True:
@@ -270,21 +424,33 @@ def main():
             continue
             
         # Nodos en el grafo mas cercanos a las longitudes y latitudes encontradas en callejero
-        origen = encuentra_nodo_mas_cercano(grafo, *lat_lon_origen)
-        destino = encuentra_nodo_mas_cercano(grafo, *lat_lon_destino)
+        origen = encuentra_nodo_mas_cercano(grafo, *lat_lon_origen, componentes=componentes)
+        destino = encuentra_nodo_mas_cercano(grafo, *lat_lon_destino, componentes=componentes)
 
         print("Seleccione el modo de cálculo:")
         print("1. Ruta más corta (distancia)")
         print("2. Ruta más rápida (tiempo)")
         print("3. Ruta más rápida con semáforos (tiempo esperado)")
-        modo = input("Ingrese una opción (1/2/3): ")
+        if peso_hora:
+            print("4. Ruta más rápida según la hora de salida (perfiles de tráfico)")
+        modo = input("Ingrese una opción (1/2/3/4): " if peso_hora else "Ingrese una opción (1/2/3): ")
+
+        if modo == "4" and peso_hora:
+            try:
+                horas, minutos = input("Ingrese la hora de salida (HH:MM): ").split(":")
+                salida = int(horas) * 3600 + int(minutos) * 60
+            except ValueError:
+                print("Hora no válida. Intente nuevamente.")
+                continue
+            calcular_y_mostrar_ruta(grafo, origen, destino, peso_hora, componentes, salida)
+            continue
 
         peso_funcion = {"1": calcula_peso_longitud, "2": calcula_peso_tiempo, "3": calcula_peso_tiempo_esperado}.get(modo)
         if not peso_funcion:
             print("Opción no válida. Intente nuevamente.")
             continue
 
-        calcular_y_mostrar_ruta(grafo, origen, destino, peso_funcion)
+        calcular_y_mostrar_ruta(grafo, origen, destino, peso_funcion, componentes)
 
     print("Gracias por usar nuestro GPS, ¡Nos vemos en tu próximo viaje!")
 
@@ -60,7 +60,31 @@ def dijkstra(G:Union[nx.Graph, nx.DiGraph], peso:Union[Callable[[nx.Graph,object
     
     return padre
 
-def camino_minimo(G, peso, origen, destino):
+def _comprueba_extremos(G, origen, destino, componentes=None):
+    """
+    Comprobaciones comunes a camino_minimo y camino_minimo_dependiente_tiempo antes de ejecutar Dijkstra.
+
+    Raises:
+        TypeError: Si origen o destino no son "hashable".
+        ValueError: Si origen o destino no están en el grafo, si coinciden (no hay camino con aristas
+            entre un vértice y sí mismo) o si el etiquetado de componentes garantiza que no hay camino.
+    """
+    if not isinstance(origen, (str, int, tuple)) or not isinstance(destino, (str, int, tuple)):
+        raise TypeError("Los nodos origen y destino deben ser hashables (str, int, tuple, etc.).")
+    if origen not in G:
+        raise ValueError("El vértice origen no está en el grafo.")
+    if destino not in G:
+        raise ValueError("El vértice destino no está en el grafo.")
+    if origen == destino:
+        raise ValueError("No existe un camino entre el origen y el destino.")
+    if componentes is not None:
+        # Sólo se puede ir hacia componentes con etiqueta menor o igual (orden topológico inverso)
+        c_origen, c_destino = componentes[origen], componentes[destino]
+        if c_destino > c_origen or (c_destino != c_origen and not G.is_directed()):
+            raise ValueError("No existe un camino entre el origen y el destino.")
+
+
+def camino_minimo(G, peso, origen, destino, componentes=None):
     """
     Calcula el camino mínimo desde el vértice origen hasta el vértice
     destino utilizando el algoritmo de Dijkstra.
@@ -70,6 +94,9 @@ def camino_minimo(G, peso, origen, destino):
         peso (Callable): Función que recibe un grafo y dos vértices, y devuelve el peso de la arista que los conecta.
         origen (object): Vértice del grafo de origen.
         destino (object): Vértice del grafo de destino.
+        componentes (Dict[object, int], opcional): Etiquetado de componentes fuertemente conexas
+            devuelto por componentes_fuertemente_conexas. Si se indica, los pares cuyo destino
+            no puede ser alcanzable según el orden de las componentes se descartan sin ejecutar Dijkstra.
     
     Returns:
         List[object]: Devuelve una lista con los vértices del camino más corto entre origen y destino.
@@ -77,10 +104,9 @@ def camino_minimo(G, peso, origen, destino):
     
     Raises:
         TypeError: Si origen o destino no son "hashable".
-        ValueError: Si no existe un camino entre origen y destino.
+        ValueError: Si origen o destino no están en el grafo, coinciden o no existe un camino entre ellos.
     """
-    if not isinstance(origen, (str, int, tuple)) or not isinstance(destino, (str, int, tuple)):
-        raise TypeError("Los nodos origen y destino deben ser hashables (str, int, tuple, etc.).")
+    _comprueba_extremos(G, origen, destino, componentes)
 
     padre = dijkstra(G, peso, origen)
     if padre[destino] is None:
@@ -95,6 +121,279 @@ def camino_minimo(G, peso, origen, destino):
     return camino[::-1]
 
 
+def dijkstra_acotado(G: Union[nx.Graph, nx.DiGraph], peso: Callable, origen: object, limite: float) -> Tuple[Dict[object, float], Dict[object, object]]:
+    """
+    Algoritmo de Dijkstra que se detiene al superar el coste "limite". Sirve para
+    búsquedas locales (por ejemplo, entre dos puntos GPS consecutivos) sin recorrer
+    toda la ciudad.
+
+    Args:
+        G (nx.Graph o nx.DiGraph): Grafo dirigido o no dirigido.
+        peso (Callable): Función que recibe un grafo y dos vértices, y devuelve el peso de la arista que los conecta.
+        origen (object): Vértice del grafo de origen.
+        limite (float): Coste máximo a explorar.
+
+    Returns:
+        Tuple[Dict[object, float], Dict[object, object]]: Par (dist, padre) con la distancia mínima
+            y el padre en el árbol de caminos mínimos de cada vértice a coste menor o igual que "limite".
+            El origen tiene distancia 0 y padre None.
+
+    Raises:
+        ValueError: Si el vértice origen no está en el grafo.
+    """
+    if origen not in G:
+        raise ValueError("El vértice origen no está en el grafo.")
+
+    dist = {origen: 0}
+    padre = {origen: None}
+    visitado = set()
+    contador = 0  # Desempate en la cola para no comparar vértices de tipos distintos
+    cola = [(0, contador, origen)]
+
+    while cola:
+        d, _, v = heapq.heappop(cola)
+        if v in visitado:
+            continue
+        visitado.add(v)
+        for u in G.neighbors(v):
+            nueva = d + peso(G, v, u)
+            if nueva <= limite and nueva < dist.get(u, INFTY):
+                dist[u] = nueva
+                padre[u] = v
+                contador += 1
+                heapq.heappush(cola, (nueva, contador, u))
+
+    return dist, padre
+
+
+def dijkstra_multiorigen(G: Union[nx.Graph, nx.DiGraph], peso: Callable, origenes: List[object]) -> Tuple[Dict[object, float], Dict[object, object]]:
+    """
+    Algoritmo de Dijkstra con varios orígenes a la vez: todos entran en la cola con coste 0 y
+    cada vértice queda etiquetado con el origen más cercano en una sola pasada, en lugar de
+    ejecutar Dijkstra una vez por origen. En un digrafo se mide el coste desde los orígenes;
+    para el coste hacia ellos basta usar G.reverse().
+
+    Args:
+        G (nx.Graph o nx.DiGraph): Grafo dirigido o no dirigido.
+        peso (Callable): Función que recibe un grafo y dos vértices, y devuelve el peso de la arista que los conecta.
+        origenes (List[object]): Vértices de origen.
+
+    Returns:
+        Tuple[Dict[object, float], Dict[object, object]]: Par (coste, fuente) con, para cada vértice
+            alcanzable desde algún origen, el coste mínimo y el origen que lo alcanza.
+
+    Raises:
+        ValueError: Si algún origen no está en el grafo.
+    """
+    coste = {}
+    fuente = {}
+    visitado = set()
+    cola = []
+    for contador, origen in enumerate(origenes):
+        if origen not in G:
+            raise ValueError(f"El vértice origen {origen} no está en el grafo.")
+        if origen not in coste:
+            coste[origen] = 0
+            fuente[origen] = origen
+            cola.append((0, contador, origen))
+    contador = len(origenes)  # Desempate en la cola para no comparar vértices de tipos distintos
+    heapq.heapify(cola)
+
+    while cola:
+        d, _, v = heapq.heappop(cola)
+        if v in visitado:
+            continue
+        visitado.add(v)
+        for u in G.neighbors(v):
+            nueva = d + peso(G, v, u)
+            if nueva < coste.get(u, INFTY):
+                coste[u] = nueva
+                fuente[u] = fuente[v]
+                contador += 1
+                heapq.heappush(cola, (nueva, contador, u))
+
+    return coste, fuente
+
+
+def dijkstra_dependiente_tiempo(G: Union[nx.Graph, nx.DiGraph], peso: Callable, origen: object, salida: float, destino: object = None) -> Tuple[Dict[object, float], Dict[object, object]]:
+    """
+    Algoritmo de Dijkstra con pesos dependientes del instante de entrada en cada arista.
+    Aquí la función de peso recibe además el instante t y devuelve el tiempo de recorrido:
+
+    def mi_peso(G, u, v, t):
+        return ...
+
+    Si los pesos cumplen la propiedad FIFO (salir más tarde nunca hace llegar antes), el
+    algoritmo calcula los instantes de llegada mínimos igual que Dijkstra clásico.
+
+    Args:
+        G (nx.Graph o nx.DiGraph): Grafo dirigido o no dirigido.
+        peso (Callable): Función que recibe un grafo, dos vértices y un instante, y devuelve el tiempo de recorrido.
+        origen (object): Vértice del grafo de origen.
+        salida (float): Instante de salida desde el origen.
+        destino (object, opcional): Si se indica, la búsqueda se detiene al fijar su instante de llegada.
+
+    Returns:
+        Tuple[Dict[object, float], Dict[object, object]]: Par (llegada, padre) con el instante de llegada
+            y el padre en el árbol de caminos mínimos de cada vértice alcanzado.
+
+    Raises:
+        ValueError: Si el vértice origen no está en el grafo.
+    """
+    if origen not in G:
+        raise ValueError("El vértice origen no está en el grafo.")
+
+    llegada = {origen: salida}
+    padre = {origen: None}
+    visitado = set()
+    contador = 0  # Desempate en la cola para no comparar vértices de tipos distintos
+    cola = [(salida, contador, origen)]
+
+    while cola:
+        t, _, v = heapq.heappop(cola)
+        if v in visitado:
+            continue
+        visitado.add(v)
+        if v == destino:
+            break
+        for u in G.neighbors(v):
+            nueva = t + peso(G, v, u, t)
+            if nueva < llegada.get(u, INFTY):
+                llegada[u] = nueva
+                padre[u] = v
+                contador += 1
+                heapq.heappush(cola, (nueva, contador, u))
+
+    return llegada, padre
+
+
+def camino_minimo_dependiente_tiempo(G, peso, origen, destino, salida, componentes=None):
+    """
+    Calcula el camino más rápido desde el vértice origen hasta el vértice destino
+    saliendo en el instante "salida", con pesos dependientes del tiempo.
+
+    Args:
+        G (nx.Graph o nx.Digraph): Grafo dirigido o no dirigido.
+        peso (Callable): Función que recibe un grafo, dos vértices y un instante, y devuelve el tiempo de recorrido.
+        origen (object): Vértice del grafo de origen.
+        destino (object): Vértice del grafo de destino.
+        salida (float): Instante de salida desde el origen.
+        componentes (Dict[object, int], opcional): Etiquetado de componentes_fuertemente_conexas
+            para descartar al instante pares sin camino.
+
+    Returns:
+        Tuple[List[object], float]: Lista de vértices del camino (del origen al destino) e instante de llegada.
+
+    Raises:
+        TypeError: Si origen o destino no son "hashable".
+        ValueError: Si origen o destino no están en el grafo, coinciden o no existe un camino entre ellos.
+    """
+    _comprueba_extremos(G, origen, destino, componentes)
+
+    llegada, padre = dijkstra_dependiente_tiempo(G, peso, origen, salida, destino)
+    if destino not in padre:
+        raise ValueError("No existe un camino entre el origen y el destino.")
+
+    camino = []
+    actual = destino
+    while actual is not None:
+        camino.append(actual)
+        actual = padre[actual]
+
+    return camino[::-1], llegada[destino]
+
+
+def componentes_fuertemente_conexas(G: Union[nx.Graph, nx.DiGraph]) -> Dict[object, int]:
+    """
+    Etiqueta cada vértice con la componente fuertemente conexa a la que pertenece
+    usando el algoritmo de Tarjan (versión iterativa para no agotar la pila de recursión
+    con grafos del tamaño del callejero de Madrid). En un grafo no dirigido las
+    componentes obtenidas son las componentes conexas.
+
+    Args:
+        G (nx.Graph o nx.DiGraph): Grafo dirigido o no dirigido.
+
+    Returns:
+        Dict[object, int]: Diccionario que asigna a cada vértice el número de su componente.
+            Dos vértices son mutuamente alcanzables si y solo si tienen la misma etiqueta.
+            Las etiquetas siguen un orden topológico inverso: si existe un camino de u a v,
+            entonces la etiqueta de v es menor o igual que la de u.
+    Example:
+        Si componentes_fuertemente_conexas(G)={1:0, 2:0, 3:1} entonces existe camino de 1 a 2
+        y de 2 a 1, pero no existe camino de ida y vuelta entre 1 y 3.
+    """
+    indice = {}
+    enlace_bajo = {}
+    en_pila = set()
+    pila = []
+    componente = {}
+    contador = 0
+    num_componentes = 0
+
+    for raiz in G.nodes:
+        if raiz in indice:
+            continue
+        indice[raiz] = enlace_bajo[raiz] = contador
+        contador += 1
+        pila.append(raiz)
+        en_pila.add(raiz)
+        recorrido = [(raiz, iter(G.neighbors(raiz)))]
+
+        while recorrido:
+            v, vecinos = recorrido[-1]
+            avanzado = False
+            for u in vecinos:
+                if u not in indice:
+                    indice[u] = enlace_bajo[u] = contador
+                    contador += 1
+                    pila.append(u)
+                    en_pila.add(u)
+                    recorrido.append((u, iter(G.neighbors(u))))
+                    avanzado = True
+                    break
+                if u in en_pila:
+                    enlace_bajo[v] = min(enlace_bajo[v], indice[u])
+            if avanzado:
+                continue
+
+            # Todos los vecinos de v explorados: cerrar v y propagar su enlace al padre
+            recorrido.pop()
+            if recorrido:
+                padre = recorrido[-1][0]
+                enlace_bajo[padre] = min(enlace_bajo[padre], enlace_bajo[v])
+            if enlace_bajo[v] == indice[v]:
+                while True:
+                    w = pila.pop()
+                    en_pila.discard(w)
+                    componente[w] = num_componentes
+                    if w == v:
+                        break
+                num_componentes += 1
+
+    return componente
+
+
+def componente_mayor(componentes: Dict[object, int]) -> int:
+    """
+    Devuelve la etiqueta de la componente con más vértices.
+
+    Args:
+        componentes (Dict[object, int]): Etiquetado devuelto por componentes_fuertemente_conexas.
+
+    Returns:
+        int: Etiqueta de la componente más grande.
+
+    Raises:
+        ValueError: Si el etiquetado está vacío.
+    """
+    if not componentes:
+        raise ValueError("El etiquetado de componentes está vacío.")
+    tamanos = {}
+    for etiqueta in componentes.values():
+        tamanos[etiqueta] = tamanos.get(etiqueta, 0) + 1
+    return max(tamanos, key=tamanos.get)
+
+
 def prim(G, peso):
     """
     Implementación del algoritmo de Prim para calcular el Árbol Abarcador Mínimo (MST).
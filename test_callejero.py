@@ -0,0 +1,71 @@
+"""
+test_callejero.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Descripción:
+Script para verificación básica de la carga del grafo desde un extracto local de OSM
+(carga_grafo_extracto de callejero.py).
+
+Escribe un extracto .osm pequeño en un fichero temporal, construye el grafo y comprueba:
+    - Contracción de los nodos intermedios de las vías (solo quedan cruces y extremos)
+    - Inversión de las vías con oneway=-1
+    - Corte de las vías que salen del extracto
+    - Sustitución completa de los atributos cuando una vía paralela más corta reemplaza a otra
+    - Que procesa_grafo no modifique el grafo que recibe
+"""
+import os
+import tempfile
+import callejero
+
+EXTRACTO = """<?xml version="1.0"?>
+<osm version="0.6">
+ <node id="1" lat="40.000" lon="-3.700"/>
+ <node id="2" lat="40.001" lon="-3.700"/>
+ <node id="3" lat="40.002" lon="-3.700"/>
+ <node id="4" lat="40.002" lon="-3.701"/>
+ <node id="5" lat="40.002" lon="-3.702"/>
+ <node id="6" lat="40.003" lon="-3.702"/>
+ <node id="7" lat="40.010" lon="-3.700"/>
+ <node id="8" lat="40.010" lon="-3.705"/>
+ <node id="9" lat="40.011" lon="-3.700"/>
+ <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/><tag k="name" v="Calle A"/></way>
+ <way id="11"><nd ref="3"/><nd ref="4"/><nd ref="5"/><tag k="highway" v="primary"/><tag k="oneway" v="-1"/></way>
+ <way id="12"><nd ref="5"/><nd ref="6"/><nd ref="99"/><tag k="highway" v="tertiary"/></way>
+ <way id="13"><nd ref="7"/><nd ref="8"/><nd ref="9"/><tag k="highway" v="motorway_link"/><tag k="maxspeed" v="100"/><tag k="name" v="M-30"/></way>
+ <way id="14"><nd ref="7"/><nd ref="9"/><tag k="highway" v="residential"/></way>
+ <way id="15"><nd ref="1"/><nd ref="7"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+#Escritura del extracto en un fichero temporal y construcción del grafo
+with tempfile.NamedTemporaryFile("w", suffix=".osm", delete=False, encoding="utf-8") as f:
+    f.write(EXTRACTO)
+try:
+    G=callejero.carga_grafo_extracto(f.name)
+finally:
+    os.remove(f.name)
+
+for u,v,datos in G.edges(data=True):
+    print(u,v,":",datos)
+
+#Contracción: los nodos 2, 4 y 8 son intermedios y la vía peatonal (15) no se carga
+assert set(G.nodes)=={1,3,5,6,7,9}
+#La longitud de la arista 1-3 es la suma de sus dos tramos (unos 111 m cada uno)
+assert abs(G[1][3]["length"]-222.4)<0.1 and G.has_edge(3,1)
+
+#oneway=-1: la vía 3-4-5 solo se recorre de 5 a 3
+assert G.has_edge(5,3) and not G.has_edge(3,5)
+
+#Corte en el borde del extracto: la vía 5-6-99 termina en 6, en ambos sentidos
+assert G.has_edge(5,6) and G.has_edge(6,5)
+
+#Arista paralela: la calle residencial directa sustituye al enlace de autopista sin heredar sus atributos
+assert G[7][9]["highway"]=="residential"
+assert "maxspeed" not in G[7][9] and "name" not in G[7][9]
+
+#procesa_grafo elimina los bucles de una copia, no del grafo recibido
+G.add_edge(1,1,length=0)
+D=callejero.procesa_grafo(G)
+assert G.has_edge(1,1) and not D.has_edge(1,1)
@@ -16,9 +16,14 @@ Después realiza vairas operaciones básicas sobre el grafo y ejecuta sobre él:
     - Búsqueda de un camino mínimo con Dijkstra
     - Prim
     - Kruskal
+
+Por último, comprueba el ajuste de trazas GPS de ajuste_trazas.py (map-matching) sobre una
+cuadrícula con los puntos en los cruces. Esta comprobación importa gps.py, por lo que requiere
+osmnx y matplotlib instalados.
 """
 import networkx as nx
 import grafo_pesado
+import ajuste_trazas
 import random
 
 from typing import Union
@@ -38,6 +43,10 @@ def peso_constante(G:Union[nx.Graph, nx.DiGraph], origen:object, destino:object)
 def peso_aleatorio(G:Union[nx.Graph, nx.DiGraph], origen:object, destino:object):
     return G[origen][destino]["peso"]
 
+#Función de peso dependiente del instante t: el peso aleatorio se duplica a partir de t=10 (hora punta)
+def peso_hora_punta(G:Union[nx.Graph, nx.DiGraph], origen:object, destino:object, t:float):
+    return G[origen][destino]["peso"]*(2 if t>=10 else 1)
+
 
 #Listas de vértices y aristas del grafo
 dirigido=False
@@ -88,4 +97,45 @@ if(not dirigido):
     print(aam_rng)
 
     aam2_rng=grafo_pesado.prim(G,peso_aleatorio)
-    print(aam2_rng)
\ No newline at end of file
+    print(aam2_rng)
+
+#Componentes fuertemente conexas y camino mínimo descartando pares sin ruta
+componentes=grafo_pesado.componentes_fuertemente_conexas(G)
+print(componentes)
+print(grafo_pesado.componente_mayor(componentes))
+
+camino_cc=grafo_pesado.camino_minimo(G,peso_aleatorio,1,5,componentes)
+print(camino_cc)
+
+#Dijkstra acotado: solo los vértices a coste menor o igual que el límite
+dist_acotada,padre_acotado=grafo_pesado.dijkstra_acotado(G,peso_constante,1,1)
+print(dist_acotada,padre_acotado)
+
+#Ajuste de trazas GPS: recorrido recto hacia el norte en una cuadrícula 10x10 con los puntos
+#en los cruces (como un vehículo parado en los semáforos). No debe zigzaguear por calles paralelas.
+cuadricula=nx.DiGraph()
+for i in range(10):
+    for j in range(10):
+        cuadricula.add_node(10*i+j,y=40+0.001*i,x=-3.7+0.001*j)
+for i in range(10):
+    for j in range(10):
+        if i<9:
+            cuadricula.add_edge(10*i+j,10*(i+1)+j,length=111)
+            cuadricula.add_edge(10*(i+1)+j,10*i+j,length=111)
+        if j<9:
+            cuadricula.add_edge(10*i+j,10*i+j+1,length=85)
+            cuadricula.add_edge(10*i+j+1,10*i+j,length=85)
+indice_cuadricula=ajuste_trazas.construye_indice_aristas(cuadricula)
+puntos_cruces=[(cuadricula.nodes[n]["y"],cuadricula.nodes[n]["x"]+0.00002) for n in (28,38,48,58,68)]
+tramos=ajuste_trazas.ajusta_traza(cuadricula,puntos_cruces,indice_cuadricula)
+ruta_ajustada=ajuste_trazas.ruta_desde_aristas(tramos[0])
+print(ruta_ajustada)
+assert len(tramos)==1 and [n for n in ruta_ajustada if n%10!=8]==[27], "La traza no sigue la calle recta"
+
+#Camino mínimo dependiente del tiempo saliendo en t=0 y en hora punta
+print(grafo_pesado.camino_minimo_dependiente_tiempo(G,peso_hora_punta,1,5,0))
+print(grafo_pesado.camino_minimo_dependiente_tiempo(G,peso_hora_punta,1,5,10))
+
+#Dijkstra multiorigen: cada vértice etiquetado con el origen más cercano (1 o 6) y su coste
+coste_mo,fuente_mo=grafo_pesado.dijkstra_multiorigen(G,peso_aleatorio,[1,6])
+print(coste_mo,fuente_mo)